@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from typing import Literal
+
+Priority = Literal["interactive", "bulk"]
+
+# 先頭ほど優先度が高い
+PRIORITIES: tuple[Priority, ...] = ("interactive", "bulk")
+
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after_s: float) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after_s = retry_after_s
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after_s)))
+
+
+class AdmissionController:
+    """
+    Bounded, priority-ordered admission in front of the extraction workers.
+
+    - at most `max_concurrency` requests run at once; `interactive_reserved` of
+      those slots are never handed to bulk requests
+    - waiting interactive requests are always dispatched before bulk ones
+    - a full queue is rejected with 429; a request whose estimated or actual
+      queue wait exceeds its deadline is shed with 503 instead of piling up
+
+    All state is owned by the event loop thread.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        interactive_reserved: int,
+        max_queue: dict[Priority, int],
+        queue_timeout_s: dict[Priority, float],
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.interactive_reserved = min(max(0, interactive_reserved), self.max_concurrency - 1)
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._queues: dict[Priority, deque[asyncio.Future[None]]] = {p: deque() for p in PRIORITIES}
+        self._active: dict[Priority, int] = {p: 0 for p in PRIORITIES}
+        self._service_ewma_s: float | None = None
+        self._wait_ewma_s: dict[Priority, float] = {p: 0.0 for p in PRIORITIES}
+        self._wait_max_s: dict[Priority, float] = {p: 0.0 for p in PRIORITIES}
+        self._admitted: dict[Priority, int] = {p: 0 for p in PRIORITIES}
+        self._rejected_full: dict[Priority, int] = {p: 0 for p in PRIORITIES}
+        self._rejected_deadline: dict[Priority, int] = {p: 0 for p in PRIORITIES}
+
+    def _slots_for(self, priority: Priority) -> int:
+        if priority == "bulk":
+            return self.max_concurrency - self.interactive_reserved
+        return self.max_concurrency
+
+    def _can_start(self, priority: Priority) -> bool:
+        if sum(self._active.values()) >= self.max_concurrency:
+            return False
+        if priority == "bulk" and self._active["bulk"] >= self._slots_for("bulk"):
+            return False
+        return True
+
+    def _queued_ahead(self, priority: Priority) -> int:
+        ahead = 0
+        for p in PRIORITIES:
+            ahead += len(self._queues[p])
+            if p == priority:
+                break
+        return ahead
+
+    def _estimated_wait_s(self, priority: Priority) -> float | None:
+        if self._service_ewma_s is None:
+            return None
+        rounds = (self._queued_ahead(priority) + 1) / self._slots_for(priority)
+        return rounds * self._service_ewma_s
+
+    def _retry_after_s(self, priority: Priority) -> float:
+        est = self._estimated_wait_s(priority)
+        return est if est is not None else 1.0
+
+    def _dispatch(self) -> None:
+        for p in PRIORITIES:
+            queue = self._queues[p]
+            while queue and self._can_start(p):
+                fut = queue.popleft()
+                if fut.done():
+                    continue
+                self._active[p] += 1
+                fut.set_result(None)
+
+    def _record_wait(self, priority: Priority, waited_s: float) -> None:
+        self._admitted[priority] += 1
+        self._wait_ewma_s[priority] += _EWMA_ALPHA * (waited_s - self._wait_ewma_s[priority])
+        self._wait_max_s[priority] = max(self._wait_max_s[priority], waited_s)
+
+    def _release(self, priority: Priority, service_s: float | None) -> None:
+        """Free a slot; `service_s` is None when the slot was never used for work."""
+        self._active[priority] -= 1
+        if service_s is not None:
+            if self._service_ewma_s is None:
+                self._service_ewma_s = service_s
+            else:
+                self._service_ewma_s += _EWMA_ALPHA * (service_s - self._service_ewma_s)
+        self._dispatch()
+
+    async def _acquire(self, priority: Priority) -> None:
+        queue = self._queues[priority]
+        if self._queued_ahead(priority) == 0 and self._can_start(priority):
+            self._active[priority] += 1
+            self._record_wait(priority, 0.0)
+            return
+
+        timeout_s = self.queue_timeout_s[priority]
+        if len(queue) >= self.max_queue[priority]:
+            self._rejected_full[priority] += 1
+            raise AdmissionRejected(429, "Too many queued requests. Please retry later.", self._retry_after_s(priority))
+
+        est = self._estimated_wait_s(priority)
+        if est is not None and est > timeout_s:
+            self._rejected_deadline[priority] += 1
+            raise AdmissionRejected(503, "Server is busy. Please retry later.", est)
+
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        queue.append(fut)
+        enqueued = time.monotonic()
+        try:
+            await asyncio.wait({fut}, timeout=timeout_s)
+        except BaseException:
+            # クライアント切断等でキャンセルされた場合: 既に枠を割り当て済みなら返却する
+            if fut.done() and not fut.cancelled():
+                self._release(priority, None)
+            else:
+                fut.cancel()
+                self._discard(priority, fut)
+            raise
+
+        if not fut.done():
+            fut.cancel()
+            self._discard(priority, fut)
+            self._rejected_deadline[priority] += 1
+            raise AdmissionRejected(503, "Server is busy. Please retry later.", self._retry_after_s(priority))
+
+        self._record_wait(priority, time.monotonic() - enqueued)
+
+    def _discard(self, priority: Priority, fut: asyncio.Future[None]) -> None:
+        try:
+            self._queues[priority].remove(fut)
+        except ValueError:
+            pass
+
+    @asynccontextmanager
+    async def admit(self, priority: Priority) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "interactive_reserved": self.interactive_reserved,
+            "service_ewma_s": round(self._service_ewma_s, 3) if self._service_ewma_s is not None else None,
+            "classes": {
+                p: {
+                    "active": self._active[p],
+                    "queue_depth": len(self._queues[p]),
+                    "max_queue": self.max_queue[p],
+                    "queue_timeout_s": self.queue_timeout_s[p],
+                    "wait_ewma_s": round(self._wait_ewma_s[p], 3),
+                    "wait_max_s": round(self._wait_max_s[p], 3),
+                    "admitted_total": self._admitted[p],
+                    "rejected_queue_full_total": self._rejected_full[p],
+                    "rejected_deadline_total": self._rejected_deadline[p],
+                }
+                for p in PRIORITIES
+            },
+        }
@@ -5,6 +5,7 @@ import logging
 import time
 
 from .config import settings
+from .hpo_store import BuildProgress
 from .hpo_store import build_or_load_store
 
 
@@ -15,6 +16,23 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _log_progress(p: BuildProgress) -> None:
+    embedded = p.docs_done - p.docs_resumed
+    rate = embedded / p.elapsed_s if p.elapsed_s > 0 else 0.0
+    remaining = p.docs_total - p.docs_done
+    eta = remaining / rate if rate > 0 else float("nan")
+    logger.info(
+        "Embedding shards %d/%d (docs=%d/%d, resumed=%d, %.1f docs/s, eta=%.0fs)",
+        p.shards_done,
+        p.shards_total,
+        p.docs_done,
+        p.docs_total,
+        p.docs_resumed,
+        rate,
+        eta,
+    )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Build or load FAISS index for HPO RAG.")
     parser.add_argument(
@@ -26,16 +44,23 @@ def main() -> None:
 
     start = time.time()
     logger.info(
-        "Initializing FAISS store (csv=%s, dir=%s, rebuild=%s)",
+        "Initializing FAISS store (csv=%s, dir=%s, rebuild=%s, shard_size=%d, workers=%d)",
         settings.hpo_csv_path,
         settings.faiss_dir,
         args.rebuild,
+        settings.faiss_shard_size,
+        settings.faiss_build_workers,
     )
-    store, hpo_by_id = build_or_load_store(force_rebuild=bool(args.rebuild))
+    index, table = build_or_load_store(force_rebuild=bool(args.rebuild), on_progress=_log_progress)
     elapsed = time.time() - start
-    logger.info("FAISS ready (terms=%d, elapsed=%.2fs)", len(hpo_by_id), elapsed)
+    logger.info(
+        "FAISS ready (terms=%d, elapsed=%.2fs, %.1f terms/s)",
+        len(table),
+        elapsed,
+        len(table) / elapsed if elapsed > 0 else 0.0,
+    )
 
-    _ = store
+    _ = index
 
 
 if __name__ == "__main__":
@@ -11,17 +11,41 @@ class Settings(BaseSettings):
     openai_api_key: str = Field(default="", validation_alias="OPENAI_API_KEY")
     openai_chat_model: str = Field(default="gpt-4o-mini", validation_alias="OPENAI_CHAT_MODEL")
     openai_embed_model: str = Field(default="text-embedding-3-small", validation_alias="OPENAI_EMBED_MODEL")
+    openai_base_url: str = Field(default="", validation_alias="OPENAI_BASE_URL")
+
+    # OpenAI 呼び出しのレート制御（プロセス全体で共有, 0 で無効）
+    openai_chat_rpm: int = Field(default=500, validation_alias="OPENAI_CHAT_RPM")
+    openai_chat_tpm: int = Field(default=200_000, validation_alias="OPENAI_CHAT_TPM")
+    openai_embed_rpm: int = Field(default=3_000, validation_alias="OPENAI_EMBED_RPM")
+    openai_embed_tpm: int = Field(default=1_000_000, validation_alias="OPENAI_EMBED_TPM")
+    openai_max_concurrency: int = Field(default=16, validation_alias="OPENAI_MAX_CONCURRENCY")
+    openai_min_concurrency: int = Field(default=1, validation_alias="OPENAI_MIN_CONCURRENCY")
+    openai_chat_latency_target_s: float = Field(default=20.0, validation_alias="OPENAI_CHAT_LATENCY_TARGET_S")
+    openai_embed_latency_target_s: float = Field(default=10.0, validation_alias="OPENAI_EMBED_LATENCY_TARGET_S")
+    openai_max_retries: int = Field(default=4, validation_alias="OPENAI_MAX_RETRIES")
 
     hpo_csv_path: str = Field(default="/data/HPO_depth_ge3.csv", validation_alias="HPO_CSV_PATH")
     faiss_dir: str = Field(default="/app/storage/faiss", validation_alias="FAISS_DIR")
     rebuild_faiss_on_startup: bool = Field(default=False, validation_alias="REBUILD_FAISS_ON_STARTUP")
+    faiss_shard_size: int = Field(default=500, validation_alias="FAISS_SHARD_SIZE")
+    faiss_build_workers: int = Field(default=4, validation_alias="FAISS_BUILD_WORKERS")
     allow_no_candidate_fit: bool = Field(default=True, validation_alias="ALLOW_NO_CANDIDATE_FIT")
+    pipelined_normalization: bool = Field(default=False, validation_alias="PIPELINED_NORMALIZATION")
+    normalize_workers: int = Field(default=4, validation_alias="NORMALIZE_WORKERS")
 
     pubcasefinder_base_url: str = Field(
         default="https://pubcasefinder.dbcls.jp/api",
         validation_alias="PUBCASEFINDER_BASE_URL",
     )
 
+    # /api/extract のアドミッション制御
+    extract_max_concurrency: int = Field(default=8, validation_alias="EXTRACT_MAX_CONCURRENCY")
+    extract_interactive_reserved: int = Field(default=2, validation_alias="EXTRACT_INTERACTIVE_RESERVED")
+    extract_max_queue_interactive: int = Field(default=32, validation_alias="EXTRACT_MAX_QUEUE_INTERACTIVE")
+    extract_max_queue_bulk: int = Field(default=128, validation_alias="EXTRACT_MAX_QUEUE_BULK")
+    extract_queue_timeout_interactive_s: float = Field(default=10.0, validation_alias="EXTRACT_QUEUE_TIMEOUT_INTERACTIVE_S")
+    extract_queue_timeout_bulk_s: float = Field(default=120.0, validation_alias="EXTRACT_QUEUE_TIMEOUT_BULK_S")
+
     cors_origins: str = Field(default="http://localhost:3000", validation_alias="CORS_ORIGINS")
     log_level: str = Field(default="INFO", validation_alias="LOG_LEVEL")
 
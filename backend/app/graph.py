@@ -1,21 +1,31 @@
 from __future__ import annotations
 
 import logging
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 from typing import TypedDict
 
 from langgraph.graph import END
 from langgraph.graph import StateGraph
 from pydantic import BaseModel
 from pydantic import Field
+from pydantic import ValidationError
 
 from .hpo_store import HPOEntry
-from .hpo_store import similarity_search
+from .hpo_store import HPOTermTable
+from .hpo_store import similarity_search_rows
+from .hpo_store import term_table
 from .openai_clients import get_chat_model
+from .openai_clients import invoke_chat
+from .openai_clients import stream_chat
 from .config import settings
 from .schemas import NormalizedSymptom
 from .schemas import TextSpan
 from .utils import dedupe_spans
 from .utils import find_all_occurrences
+from .utils import iter_streamed_json_objects
 from .utils import normalize_whitespace
 
 logger = logging.getLogger(__name__)
@@ -35,17 +45,24 @@ class HPOChoice(BaseModel):
     hpo_id: str | None = None
 
 
+# HPOChoice は {"hpo_id": "HP:xxxxxxx"} 程度なので TPM の予約は小さくてよい
+_HPO_CHOICE_OUTPUT_TOKENS = 64
+
+
 class GraphState(TypedDict):
     text: str
     extracted: list[ExtractedSymptomRaw]
     normalized: list[NormalizedSymptom]
 
 
-def _extract_symptoms_node(state: GraphState) -> GraphState:
-    text = normalize_whitespace(state["text"])
-    model = get_chat_model().with_structured_output(ExtractionOutput)
-
-    prompt = (
+def _extraction_prompt(text: str, json_format_hint: bool = False) -> str:
+    format_rule = (
+        '- 形式: {"symptoms": [{"symptom": "症状語", "spans": [{"start": 0, "end": 2, "text": "本文の該当部分"}], '
+        '"negated_spans": []}]}\n'
+        if json_format_hint
+        else ""
+    )
+    return (
         "あなたは臨床文章から“症状(=患者の所見/症候)”を抽出する専門家です。\n"
         "次の日本語テキストから症状に当たる表現を抽出してJSONで返してください。\n"
         "\n"
@@ -56,12 +73,19 @@ def _extract_symptoms_node(state: GraphState) -> GraphState:
         "- 否定(例: 〜ない/〜なし/否定/認めず)の症状は negated_spans に入れ、spans(肯定)には入れない\n"
         "- 病名・検査名・臓器名・年齢・性別などは症状ではないので除外\n"
         "- 出力は必ずJSONのみ\n"
+        f"{format_rule}"
         "\n"
         f"本文:\n{text}"
     )
 
+
+def _extract_symptoms_node(state: GraphState) -> GraphState:
+    text = normalize_whitespace(state["text"])
+    model = get_chat_model().with_structured_output(ExtractionOutput)
+    prompt = _extraction_prompt(text)
+
     try:
-        out = model.invoke(prompt)
+        out = invoke_chat(model, prompt)
         logger.info(f"Extracted {len(out.symptoms)} raw symptoms from text")
     except Exception as e:
         logger.error(f"Failed to extract symptoms: {e}")
@@ -101,14 +125,10 @@ def _expand_spans(text: str, symptom: str, spans: list[TextSpan]) -> list[TextSp
     return [TextSpan(start=s, end=e, text=text[s:e]) for s, e in repaired]
 
 
-def _choose_hpo_id(symptom: str, evidence: str, candidates: list[HPOEntry]) -> str:
+def _choose_hpo_id(symptom: str, evidence: str, table: HPOTermTable, candidates: list[int]) -> str:
+    """`candidates` are term table rows from similarity_search_rows."""
     model = get_chat_model().with_structured_output(HPOChoice)
-    c_text = "\n\n".join(
-        [
-            f"- {c.hpo_id}\n  日本語:{c.label_ja}\n  英語:{c.label_en}\n  定義:{c.definition_ja}"
-            for c in candidates
-        ]
-    )
+    c_text = table.prompt_text(candidates)
     no_fit_rule = (
         "- 候補に適切なものが無い場合は hpo_id を null にする\n"
         if settings.allow_no_candidate_fit
@@ -128,27 +148,56 @@ def _choose_hpo_id(symptom: str, evidence: str, candidates: list[HPOEntry]) -> s
     )
     
     try:
-        choice = model.invoke(prompt)
+        choice = invoke_chat(model, prompt, output_tokens=_HPO_CHOICE_OUTPUT_TOKENS)
         chosen_id = choice.hpo_id.strip() if choice.hpo_id else ""
 
         if not chosen_id:
             return ""
         
         # バリデーション: LLMが候補以外のIDを返した場合
-        valid_ids = {c.hpo_id for c in candidates}
+        valid_ids = {table.hpo_id(row) for row in candidates}
         if chosen_id not in valid_ids:
             logger.warning(
                 f"LLM returned invalid HPO ID: {chosen_id} for symptom '{symptom}'. "
-                f"Using first candidate: {candidates[0].hpo_id}"
+                f"Using first candidate: {table.hpo_id(candidates[0])}"
             )
-            return candidates[0].hpo_id
+            return table.hpo_id(candidates[0])
         
         logger.debug(f"Mapped symptom '{symptom}' to {chosen_id}")
         return chosen_id
     except Exception as e:
         logger.error(f"Failed to choose HPO ID for symptom '{symptom}': {e}")
         # フォールバック: 最初の候補を使用
-        return candidates[0].hpo_id if candidates else ""
+        return table.hpo_id(candidates[0]) if candidates else ""
+
+
+def _normalize_symptom(text: str, s: ExtractedSymptomRaw) -> NormalizedSymptom | None:
+    symptom = s.symptom.strip()
+    spans = _expand_spans(text, symptom, s.spans)
+    if not spans:
+        return None
+    evidence = " / ".join([sp.text for sp in spans[:3]])
+
+    # 検索結果は行番号のまま扱い、HPOEntry は採用した1件だけ作る
+    table = term_table()
+    candidates = similarity_search_rows(query=f"{symptom}\n{evidence}", k=8)
+    chosen_id = ""
+    chosen: HPOEntry | None = None
+    if candidates:
+        chosen_id = _choose_hpo_id(symptom=symptom, evidence=evidence, table=table, candidates=candidates)
+        if chosen_id:
+            row = table.row(chosen_id)
+            chosen = table.entry(row if row in candidates else candidates[0])
+
+    return NormalizedSymptom(
+        symptom=symptom,
+        spans=spans,
+        evidence=evidence,
+        hpo_id=chosen.hpo_id if chosen else None,
+        label_en=chosen.label_en if chosen else None,
+        label_ja=chosen.label_ja if chosen else None,
+        hpo_url=f"https://hpo.jax.org/browse/term/{chosen.hpo_id}" if chosen else None,
+    )
 
 
 def _normalize_hpo_node(state: GraphState) -> GraphState:
@@ -156,36 +205,69 @@ def _normalize_hpo_node(state: GraphState) -> GraphState:
     normalized: list[NormalizedSymptom] = []
 
     for s in state["extracted"]:
-        symptom = s.symptom.strip()
-        spans = _expand_spans(text, symptom, s.spans)
-        if not spans:
-            continue
-        evidence = " / ".join([sp.text for sp in spans[:3]])
-
-        candidates = similarity_search(query=f"{symptom}\n{evidence}", k=8)
-        chosen_id = ""
-        chosen: HPOEntry | None = None
-        if candidates:
-            chosen_id = _choose_hpo_id(symptom=symptom, evidence=evidence, candidates=candidates)
-            if chosen_id:
-                chosen = next((c for c in candidates if c.hpo_id == chosen_id), candidates[0])
-
-        normalized.append(
-            NormalizedSymptom(
-                symptom=symptom,
-                spans=spans,
-                evidence=evidence,
-                hpo_id=chosen.hpo_id if chosen else None,
-                label_en=chosen.label_en if chosen else None,
-                label_ja=chosen.label_ja if chosen else None,
-                hpo_url=f"https://hpo.jax.org/browse/term/{chosen.hpo_id}" if chosen else None,
-            )
-        )
+        n = _normalize_symptom(text, s)
+        if n is not None:
+            normalized.append(n)
 
     normalized.sort(key=lambda x: (x.hpo_id is None, x.hpo_id or ""))
     return {**state, "normalized": normalized}
 
 
+def _extract_and_normalize_node(state: GraphState) -> GraphState:
+    """
+    Pipelined mode: stream the extraction JSON and start normalizing each symptom
+    as soon as its object is complete, overlapping the extraction tail with
+    retrieval / HPO choice.
+    """
+    text = normalize_whitespace(state["text"])
+    model = get_chat_model().bind(response_format={"type": "json_object"})
+    prompt = _extraction_prompt(text, json_format_hint=True)
+
+    extracted: list[ExtractedSymptomRaw] = []
+    futures: list[Future[NormalizedSymptom | None]] = []
+    # 症状名ごとに正規化を投入済みの件数（リトライをまたいで保持）
+    submitted: Counter[str] = Counter()
+
+    ex = ThreadPoolExecutor(max_workers=max(1, settings.normalize_workers), thread_name_prefix="normalize")
+
+    def _consume(chunks: Iterator[str]) -> None:
+        occurrences: Counter[str] = Counter()
+        for obj in iter_streamed_json_objects(chunks, depth=2):
+            try:
+                s = ExtractedSymptomRaw.model_validate(obj)
+            except ValidationError as e:
+                logger.warning(f"Skipping malformed streamed symptom: {e}")
+                continue
+            symptom = s.symptom.strip()
+            if not symptom:
+                continue
+            # 逐次モードと同じく同名の症状も残すが、リトライで再送された分（前回の試行で投入済みの
+            # n 件目まで）は二重に正規化しない
+            occurrences[symptom] += 1
+            if occurrences[symptom] <= submitted[symptom]:
+                continue
+            submitted[symptom] = occurrences[symptom]
+            s = ExtractedSymptomRaw(symptom=symptom, spans=s.spans, negated_spans=s.negated_spans)
+            extracted.append(s)
+            futures.append(ex.submit(_normalize_symptom, text, s))
+
+    try:
+        try:
+            stream_chat(model, prompt, _consume)
+            logger.info(f"Streamed {len(extracted)} raw symptoms from text")
+        except Exception as e:
+            logger.error(f"Failed to extract symptoms: {e}")
+            raise
+
+        normalized = [n for n in (f.result() for f in futures) if n is not None]
+    finally:
+        # 失敗時は未着手の正規化を取り消し、実行中のもの（embed/chat 呼び出し）の完了を待たずにエラーを返す
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    normalized.sort(key=lambda x: (x.hpo_id is None, x.hpo_id or ""))
+    return {**state, "text": text, "extracted": extracted, "normalized": normalized}
+
+
 graph = StateGraph(GraphState)
 graph.add_node("extract", _extract_symptoms_node)
 graph.add_node("normalize", _normalize_hpo_node)
@@ -195,8 +277,16 @@ graph.add_edge("normalize", END)
 
 app_graph = graph.compile()
 
+pipelined_graph = StateGraph(GraphState)
+pipelined_graph.add_node("extract_normalize", _extract_and_normalize_node)
+pipelined_graph.set_entry_point("extract_normalize")
+pipelined_graph.add_edge("extract_normalize", END)
+
+app_pipelined_graph = pipelined_graph.compile()
+
 
 def run_graph(text: str) -> list[NormalizedSymptom]:
     state: GraphState = {"text": text, "extracted": [], "normalized": []}
-    out = app_graph.invoke(state)
+    compiled = app_pipelined_graph if settings.pipelined_normalization else app_graph
+    out = compiled.invoke(state)
     return out["normalized"]
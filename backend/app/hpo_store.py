@@ -1,18 +1,34 @@
 from __future__ import annotations
 
 import csv
+import hashlib
+import logging
 import os
+import shutil
+import sys
 import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from dataclasses import dataclass
+from typing import Callable
+from typing import Iterable
 
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from .config import settings
 from .openai_clients import get_embeddings
 
+logger = logging.getLogger(__name__)
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class HPOEntry:
     hpo_id: str
     label_en: str
@@ -20,8 +36,97 @@ class HPOEntry:
     definition_ja: str
 
 
-_faiss_store: FAISS | None = None
-_hpo_by_id: dict[str, HPOEntry] | None = None
+# 候補プロンプトの1行分の書式: "- {hpo_id}\n  日本語:{label_ja}\n  英語:{label_en}\n  定義:{definition_ja}"
+_FRAGMENT_ID_PREFIX = "- "
+_FRAGMENT_JA_SEP = "\n  日本語:"
+_FRAGMENT_EN_SEP = "\n  英語:"
+_FRAGMENT_DEF_SEP = "\n  定義:"
+
+
+class HPOTermTable:
+    """
+    Read-only, columnar HPO term table addressed by row number.
+
+    Each term is stored once, as the candidate line used in the HPO choice
+    prompt. label_ja / label_en / definition_ja are slices of that line located
+    by per-row label lengths, so there is no per-term object and no second copy
+    of the labels. Only the id is also kept on its own, as the lookup key.
+    """
+
+    __slots__ = ("_ids", "_fragments", "_label_lengths", "_row_by_id")
+
+    def __init__(self, entries: Iterable[HPOEntry]) -> None:
+        # 同一 ID が複数行ある場合は従来どおり後勝ち
+        unique = {e.hpo_id: e for e in entries}
+        ids: list[str] = []
+        fragments: list[str] = []
+        label_lengths = array("I")
+        for e in unique.values():
+            ids.append(e.hpo_id)
+            fragments.append(
+                f"{_FRAGMENT_ID_PREFIX}{e.hpo_id}{_FRAGMENT_JA_SEP}{e.label_ja}"
+                f"{_FRAGMENT_EN_SEP}{e.label_en}{_FRAGMENT_DEF_SEP}{e.definition_ja}"
+            )
+            label_lengths.append(len(e.label_ja))
+            label_lengths.append(len(e.label_en))
+        self._ids = tuple(ids)
+        self._fragments = tuple(fragments)
+        self._label_lengths = label_lengths
+        self._row_by_id = {hpo_id: i for i, hpo_id in enumerate(self._ids)}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _offsets(self, row: int) -> tuple[int, int, int, int, int]:
+        ja_start = len(_FRAGMENT_ID_PREFIX) + len(self._ids[row]) + len(_FRAGMENT_JA_SEP)
+        ja_end = ja_start + self._label_lengths[2 * row]
+        en_start = ja_end + len(_FRAGMENT_EN_SEP)
+        en_end = en_start + self._label_lengths[2 * row + 1]
+        return ja_start, ja_end, en_start, en_end, en_end + len(_FRAGMENT_DEF_SEP)
+
+    def row(self, hpo_id: str) -> int:
+        return self._row_by_id.get(hpo_id, -1)
+
+    def entry(self, row: int) -> HPOEntry:
+        fragment = self._fragments[row]
+        ja_start, ja_end, en_start, en_end, def_start = self._offsets(row)
+        return HPOEntry(
+            hpo_id=self._ids[row],
+            label_en=fragment[en_start:en_end],
+            label_ja=fragment[ja_start:ja_end],
+            definition_ja=fragment[def_start:],
+        )
+
+    def hpo_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def prompt_text(self, rows: list[int]) -> str:
+        """Candidate list for the HPO choice prompt, joined from the precomputed fragments."""
+        return "\n\n".join([self._fragments[row] for row in rows])
+
+    def approx_nbytes(self) -> int:
+        total = sum(
+            sys.getsizeof(c) for c in (self._ids, self._fragments, self._label_lengths, self._row_by_id)
+        )
+        total += sum(sys.getsizeof(v) for v in self._ids)
+        total += sum(sys.getsizeof(v) for v in self._fragments)
+        return total
+
+
+@dataclass(frozen=True)
+class BuildProgress:
+    shards_done: int
+    shards_total: int
+    docs_done: int
+    docs_total: int
+    docs_resumed: int
+    elapsed_s: float
+
+
+_faiss_index: faiss.Index | None = None
+_term_table: HPOTermTable | None = None
+# FAISS インデックス上の位置 -> _term_table の行番号（該当なしは -1）
+_faiss_rows: array | None = None
 
 _store_init_lock = threading.Lock()
 _store_init_started = False
@@ -121,17 +226,183 @@ def _entries_to_documents(entries: list[HPOEntry]) -> list[Document]:
     return docs
 
 
-def build_or_load_store(force_rebuild: bool = False) -> tuple[FAISS, dict[str, HPOEntry]]:
-    global _faiss_store, _hpo_by_id
-    if not force_rebuild and _faiss_store is not None and _hpo_by_id is not None:
+def _shard_checkpoint_dir() -> str:
+    return os.path.join(settings.faiss_dir, "shards")
+
+
+def _shard_checkpoint_path(index: int, docs: list[Document]) -> str:
+    # モデル名と本文のハッシュをファイル名に含め、CSV/モデルが変わった古いチェックポイントは使わない
+    h = hashlib.sha256(settings.openai_embed_model.encode("utf-8"))
+    for d in docs:
+        h.update(b"\0")
+        h.update(d.page_content.encode("utf-8"))
+    return os.path.join(_shard_checkpoint_dir(), f"shard_{index:05d}_{h.hexdigest()[:16]}.npy")
+
+
+def _load_shard_checkpoint(path: str, n_docs: int) -> np.ndarray | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        vectors = np.load(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable shard checkpoint {path}: {e}")
+        return None
+    if vectors.ndim != 2 or vectors.shape[0] != n_docs:
+        logger.warning(f"Ignoring shard checkpoint with unexpected shape {vectors.shape}: {path}")
+        return None
+    return vectors
+
+
+def _save_shard_checkpoint(path: str, vectors: np.ndarray) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp_path, path)
+
+
+def _build_store_sharded(
+    docs: list[Document],
+    embeddings: Embeddings,
+    on_progress: Callable[[BuildProgress], None] | None = None,
+) -> FAISS:
+    """
+    Embed `docs` in shards with bounded parallelism, checkpointing each finished
+    shard under FAISS_DIR/shards so an interrupted build resumes where it stopped.
+    """
+    shard_size = max(1, settings.faiss_shard_size)
+    shards = [docs[i : i + shard_size] for i in range(0, len(docs), shard_size)]
+    os.makedirs(_shard_checkpoint_dir(), exist_ok=True)
+
+    start = time.monotonic()
+    vectors_by_shard: dict[int, np.ndarray] = {}
+    pending: list[int] = []
+    for i, shard in enumerate(shards):
+        vectors = _load_shard_checkpoint(_shard_checkpoint_path(i, shard), len(shard))
+        if vectors is None:
+            pending.append(i)
+        else:
+            vectors_by_shard[i] = vectors
+
+    docs_resumed = sum(len(shards[i]) for i in vectors_by_shard)
+    docs_done = docs_resumed
+    if docs_resumed:
+        logger.info(f"Resuming FAISS build from {len(vectors_by_shard)}/{len(shards)} checkpointed shards")
+
+    def _report() -> None:
+        if on_progress is None:
+            return
+        on_progress(
+            BuildProgress(
+                shards_done=len(vectors_by_shard),
+                shards_total=len(shards),
+                docs_done=docs_done,
+                docs_total=len(docs),
+                docs_resumed=docs_resumed,
+                elapsed_s=time.monotonic() - start,
+            )
+        )
+
+    def _embed_shard(index: int) -> np.ndarray:
+        shard = shards[index]
+        vectors = np.asarray(embeddings.embed_documents([d.page_content for d in shard]), dtype=np.float32)
+        _save_shard_checkpoint(_shard_checkpoint_path(index, shard), vectors)
+        return vectors
+
+    _report()
+    if pending:
+        failed_index: int | None = None
+        failure: BaseException | None = None
+        with ThreadPoolExecutor(max_workers=max(1, settings.faiss_build_workers), thread_name_prefix="faiss_embed") as ex:
+            futures = {ex.submit(_embed_shard, i): i for i in pending}
+            remaining = set(futures)
+            while remaining and failure is None:
+                done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    error = fut.exception()
+                    if error is not None:
+                        if failure is None:
+                            failed_index, failure = futures[fut], error
+                        continue
+                    index = futures[fut]
+                    vectors_by_shard[index] = fut.result()
+                    docs_done += len(shards[index])
+                    _report()
+            for other in remaining:
+                other.cancel()
+        if failure is not None:
+            # 実行中だったシャードは executor 終了時にチェックポイント済みになるため、ディスク上の件数を数える
+            checkpointed = sum(
+                1 for i, shard in enumerate(shards) if os.path.exists(_shard_checkpoint_path(i, shard))
+            )
+            logger.error(
+                f"Embedding shard {failed_index} failed; "
+                f"{checkpointed}/{len(shards)} shards are checkpointed for resume"
+            )
+            raise failure
+
+    text_embeddings = []
+    metadatas = []
+    for i, shard in enumerate(shards):
+        for doc, vector in zip(shard, vectors_by_shard[i]):
+            text_embeddings.append((doc.page_content, vector.tolist()))
+            metadatas.append(doc.metadata)
+    return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+
+
+def _approx_docstore_nbytes(store: FAISS) -> int:
+    total = sys.getsizeof(store.index_to_docstore_id)
+    for doc_id in store.index_to_docstore_id.values():
+        doc = store.docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            continue
+        total += sys.getsizeof(doc) + sys.getsizeof(doc.__dict__) + sys.getsizeof(doc.page_content)
+        total += sys.getsizeof(doc.metadata) + sum(sys.getsizeof(v) for v in doc.metadata.values())
+    return total
+
+
+def _index_rows(store: FAISS, table: HPOTermTable) -> array:
+    """
+    Map FAISS positions to term table rows.
+    Search only needs the vector index and the row numbers, so the caller keeps
+    `store.index` and drops the wrapper; its Documents (long page_content +
+    metadata dicts) duplicate what the table holds.
+    """
+    rows = array("i", [-1]) * store.index.ntotal
+    for pos, doc_id in store.index_to_docstore_id.items():
+        doc = store.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            hpo_id = (doc.metadata or {}).get("hpo_id")
+            if isinstance(hpo_id, str):
+                rows[pos] = table.row(hpo_id)
+    released = _approx_docstore_nbytes(store)
+    logger.info(
+        f"HPO term table ready: {len(table)} terms, ~{table.approx_nbytes() / 1e6:.1f} MB "
+        f"(released ~{released / 1e6:.1f} MB of FAISS docstore)"
+    )
+    return rows
+
+
+def build_or_load_store(
+    force_rebuild: bool = False,
+    on_progress: Callable[[BuildProgress], None] | None = None,
+) -> tuple[faiss.Index, HPOTermTable]:
+    """
+    Load (or build) the HPO vector index and term table.
+
+    Returns the raw faiss index, not the LangChain FAISS wrapper: the wrapper's
+    docstore is not kept in memory, so it could neither search nor save_local.
+    Index positions map to table rows via `_faiss_rows`.
+    """
+    global _faiss_index, _term_table, _faiss_rows
+    if not force_rebuild and _faiss_index is not None and _term_table is not None:
         _store_ready.set()
-        return _faiss_store, _hpo_by_id
+        return _faiss_index, _term_table
 
     os.makedirs(settings.faiss_dir, exist_ok=True)
 
     hpo_csv_path = _resolve_hpo_csv_path(settings.hpo_csv_path)
     entries = _read_hpo_csv(hpo_csv_path)
-    hpo_by_id = {e.hpo_id: e for e in entries}
+    table = HPOTermTable(entries)
     embeddings = get_embeddings()
 
     index_exists = os.path.exists(os.path.join(settings.faiss_dir, "index.faiss")) and os.path.exists(
@@ -144,13 +415,17 @@ def build_or_load_store(force_rebuild: bool = False) -> tuple[FAISS, dict[str, H
         store = FAISS.load_local(settings.faiss_dir, embeddings, allow_dangerous_deserialization=True)
     else:
         docs = _entries_to_documents(entries)
-        store = FAISS.from_documents(docs, embeddings)
+        store = _build_store_sharded(docs, embeddings, on_progress=on_progress)
         store.save_local(settings.faiss_dir)
+        shutil.rmtree(_shard_checkpoint_dir(), ignore_errors=True)
+        del docs
+    del entries
 
-    _faiss_store = store
-    _hpo_by_id = hpo_by_id
+    _faiss_rows = _index_rows(store, table)
+    _faiss_index = store.index
+    _term_table = table
     _store_ready.set()
-    return store, hpo_by_id
+    return _faiss_index, _term_table
 
 
 def start_store_init_background(force_rebuild: bool = False) -> None:
@@ -173,7 +448,13 @@ def start_store_init_background(force_rebuild: bool = False) -> None:
 
 
 def store_ready() -> bool:
-    return _store_ready.is_set() and _store_error is None and _faiss_store is not None and _hpo_by_id is not None
+    return _store_ready.is_set() and _store_error is None and _faiss_index is not None and _term_table is not None
+
+
+def store_error() -> str | None:
+    if _store_ready.is_set() and _store_error is not None:
+        return f"HPO store initialization failed: {_store_error}"
+    return None
 
 
 def require_store_ready() -> None:
@@ -182,22 +463,36 @@ def require_store_ready() -> None:
 
     start_store_init_background()
 
-    if _store_ready.is_set() and _store_error is not None:
-        raise StoreNotReadyError(f"HPO store initialization failed: {_store_error}")
+    error = store_error()
+    if error is not None:
+        raise StoreNotReadyError(error)
     raise StoreNotReadyError("HPO store is initializing. Please wait and retry.")
 
 
-def similarity_search(query: str, k: int = 8) -> list[HPOEntry]:
+def term_table() -> HPOTermTable:
     require_store_ready()
-    store, hpo_by_id = build_or_load_store()
-    results = store.similarity_search(query, k=k)
-    out: list[HPOEntry] = []
-    for doc in results:
-        hpo_id = (doc.metadata or {}).get("hpo_id")
-        if not isinstance(hpo_id, str):
-            continue
-        entry = hpo_by_id.get(hpo_id)
-        if entry is None:
+    _, table = build_or_load_store()
+    return table
+
+
+def similarity_search_rows(query: str, k: int = 8) -> list[int]:
+    """Nearest terms as term_table() row numbers (no per-hit objects are built)."""
+    require_store_ready()
+    index, _ = build_or_load_store()
+    faiss_rows = _faiss_rows
+    # docstore は保持していないため、インデックスを直接検索して行番号に引き当てる
+    vector = np.asarray([get_embeddings().embed_query(query)], dtype=np.float32)
+    _, positions = index.search(vector, k)
+    out: list[int] = []
+    for pos in positions[0]:
+        if pos < 0 or faiss_rows is None or pos >= len(faiss_rows):
             continue
-        out.append(entry)
+        row = faiss_rows[pos]
+        if row >= 0:
+            out.append(row)
     return out
+
+
+def similarity_search(query: str, k: int = 8) -> list[HPOEntry]:
+    table = term_table()
+    return [table.entry(row) for row in similarity_search_rows(query, k=k)]
@@ -3,15 +3,22 @@ from __future__ import annotations
 import logging
 
 from fastapi import FastAPI
+from fastapi import Header
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+from .admission import AdmissionController
+from .admission import AdmissionRejected
+from .admission import Priority
 from .config import settings
 from .graph import run_graph
 from .hpo_store import StoreNotReadyError
 from .hpo_store import require_store_ready
 from .hpo_store import start_store_init_background
+from .hpo_store import store_error
 from .hpo_store import store_ready
+from .openai_clients import limiter_stats
 from .pubcasefinder import predict_diseases
 from .schemas import ExtractRequest
 from .schemas import ExtractResponse
@@ -38,6 +45,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 抽出リクエストのアドミッション制御（優先度付きキュー + 期限超過時の早期拒否）
+extract_admission = AdmissionController(
+    max_concurrency=settings.extract_max_concurrency,
+    interactive_reserved=settings.extract_interactive_reserved,
+    max_queue={
+        "interactive": settings.extract_max_queue_interactive,
+        "bulk": settings.extract_max_queue_bulk,
+    },
+    queue_timeout_s={
+        "interactive": settings.extract_queue_timeout_interactive_s,
+        "bulk": settings.extract_queue_timeout_bulk_s,
+    },
+)
+
 
 @app.on_event("startup")
 def _startup() -> None:
@@ -49,12 +70,22 @@ def _startup() -> None:
 
 
 @app.get("/health")
-def health() -> dict:
-    return {"ok": True, "store_ready": store_ready()}
+async def health() -> dict:
+    return {
+        "ok": True,
+        "store_ready": store_ready(),
+        "store_error": store_error(),
+        "openai": limiter_stats(),
+        "extract_admission": extract_admission.stats(),
+    }
 
 
 @app.post("/api/extract", response_model=ExtractResponse)
-def extract(req: ExtractRequest) -> ExtractResponse:
+async def extract(
+    req: ExtractRequest,
+    # ヘッダ無しの直接呼び出し（バッチ等）は bulk 扱い。UI は Next.js プロキシが interactive を付与する
+    x_priority: Priority = Header(default="bulk"),
+) -> ExtractResponse:
     if not settings.openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY is missing")
     try:
@@ -62,7 +93,16 @@ def extract(req: ExtractRequest) -> ExtractResponse:
     except StoreNotReadyError as e:
         raise HTTPException(status_code=503, detail=str(e))
     text = normalize_whitespace(req.text)
-    symptoms = run_graph(text)
+    try:
+        async with extract_admission.admit(x_priority):
+            symptoms = await run_in_threadpool(run_graph, text)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected {x_priority} extract request ({e.status_code}): {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": e.retry_after_header},
+        )
     return ExtractResponse(text=text, symptoms=symptoms)
 
 
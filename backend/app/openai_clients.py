@@ -1,22 +1,235 @@
 from __future__ import annotations
 
+import logging
+from functools import lru_cache
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import TypeVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
+from openai import APIConnectionError
+from openai import InternalServerError
+from openai import RateLimitError
+from tenacity import RetryCallState
+from tenacity import Retrying
+from tenacity import retry_if_exception_type
+from tenacity import stop_after_attempt
+from tenacity import wait_exponential
 
 from .config import settings
+from .rate_limit import CallSlot
+from .rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 出力側のトークンも TPM に計上されるため、呼び出しごとに見込み分を上乗せして予約する
+# （呼び出し後に API が返す usage で差分を精算する）
+DEFAULT_OUTPUT_TOKEN_RESERVE = 1024
+
+_RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+# Retry-After が無い 429 と一時的なエラーの待ち時間: 1, 2, 4, ... 最大 20 秒
+_backoff = wait_exponential(multiplier=1, max=20)
+
+
+@lru_cache(maxsize=1)
+def chat_limiter() -> RateLimiter:
+    return RateLimiter(
+        name="chat",
+        rpm=settings.openai_chat_rpm,
+        tpm=settings.openai_chat_tpm,
+        max_concurrency=settings.openai_max_concurrency,
+        min_concurrency=settings.openai_min_concurrency,
+        target_latency_s=settings.openai_chat_latency_target_s,
+    )
+
+
+@lru_cache(maxsize=1)
+def embed_limiter() -> RateLimiter:
+    return RateLimiter(
+        name="embed",
+        rpm=settings.openai_embed_rpm,
+        tpm=settings.openai_embed_tpm,
+        max_concurrency=settings.openai_max_concurrency,
+        min_concurrency=settings.openai_min_concurrency,
+        target_latency_s=settings.openai_embed_latency_target_s,
+    )
+
+
+def limiter_stats() -> dict:
+    return {"chat": chat_limiter().stats(), "embed": embed_limiter().stats()}
+
+
+def estimate_tokens(text: str) -> int:
+    # 日本語は概ね1文字1トークン以下なので、文字数を上限寄りの見積もりとして使う
+    return max(1, len(text))
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    raw = response.headers.get("retry-after")
+    try:
+        return float(raw) if raw is not None else None
+    except ValueError:
+        return None
+
+
+class _UsageCallback(BaseCallbackHandler):
+    """Collects total_tokens reported for the LLM calls of one invocation."""
+
+    def __init__(self) -> None:
+        self.total_tokens: int | None = None
+
+    def _add(self, tokens: int) -> None:
+        self.total_tokens = (self.total_tokens or 0) + tokens
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage and usage.get("total_tokens") is not None:
+                    self._add(int(usage["total_tokens"]))
+                    found = True
+        if not found:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            if token_usage.get("total_tokens") is not None:
+                self._add(int(token_usage["total_tokens"]))
+
 
+def _limiter_wait(limiter: RateLimiter) -> Callable[[RetryCallState], float]:
+    def _wait(retry_state: RetryCallState) -> float:
+        backoff = _backoff(retry_state)
+        error = retry_state.outcome.exception() if retry_state.outcome else None
+        if isinstance(error, RateLimitError):
+            # 429 は quota 全体の問題なので全呼び出し元を止める（このスレッドも slot() の pause 待ちで待機する）
+            limiter.pause(_retry_after_seconds(error) or backoff)
+            return 0.0
+        return backoff
 
+    return _wait
+
+
+def call_with_limits(limiter: RateLimiter, tokens: int, fn: Callable[[CallSlot], T]) -> T:
+    """
+    Run `fn` inside a limiter slot, retrying 429 / transient errors.
+    A 429 shrinks the shared concurrency limit and pauses every caller for
+    Retry-After (or an exponential backoff); other transient errors only back
+    off the retrying thread.
+    """
+    attempts = max(1, settings.openai_max_retries + 1)
+
+    def _attempt() -> T:
+        with limiter.slot(tokens) as slot:
+            try:
+                return fn(slot)
+            except RateLimitError:
+                # 429 は quota を消費しないので予約分を返却する
+                slot.mark_rate_limited()
+                slot.record_usage(0)
+                raise
+
+    retrying = Retrying(
+        wait=_limiter_wait(limiter),
+        stop=stop_after_attempt(attempts),
+        retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+        before_sleep=lambda retry_state: logger.warning(
+            f"Retry {retry_state.attempt_number}/{attempts - 1} for OpenAI {limiter.name} call: "
+            f"{type(retry_state.outcome.exception()).__name__}"
+        ),
+        reraise=True,
+    )
+    return retrying(_attempt)
+
+
+def _chat_call(slot: CallSlot, run: Callable[[dict], T]) -> T:
+    usage = _UsageCallback()
+    try:
+        return run({"callbacks": [usage]})
+    finally:
+        slot.record_usage(usage.total_tokens)
+
+
+def invoke_chat(model: Runnable, prompt: str, output_tokens: int = DEFAULT_OUTPUT_TOKEN_RESERVE) -> Any:
+    """`output_tokens` is the expected completion size reserved against TPM until usage is known."""
+    tokens = estimate_tokens(prompt) + output_tokens
+    return call_with_limits(
+        chat_limiter(),
+        tokens,
+        lambda slot: _chat_call(slot, lambda config: model.invoke(prompt, config=config)),
+    )
+
+
+def stream_chat(
+    model: Runnable,
+    prompt: str,
+    consume: Callable[[Iterator[str]], T],
+    output_tokens: int = DEFAULT_OUTPUT_TOKEN_RESERVE,
+) -> T:
+    """
+    Stream the text of a chat completion into `consume` inside one limiter slot.
+    `consume` is called again with a fresh stream if the call is retried.
+    """
+    tokens = estimate_tokens(prompt) + output_tokens
+
+    def _texts(config: dict) -> Iterator[str]:
+        for chunk in model.stream(prompt, config=config):
+            content = chunk.content
+            if isinstance(content, str) and content:
+                yield content
+
+    return call_with_limits(
+        chat_limiter(),
+        tokens,
+        lambda slot: _chat_call(slot, lambda config: consume(_texts(config))),
+    )
+
+
+class RateLimitedOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings whose requests go through the shared embed limiter, one slot per API batch."""
+
+    def embed_documents(self, texts: list[str], chunk_size: int | None = 0) -> list[list[float]]:
+        batch_size = chunk_size or self.chunk_size
+        embed = super().embed_documents
+        out: list[list[float]] = []
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i : i + batch_size]
+            tokens = sum(estimate_tokens(t) for t in batch)
+            out.extend(call_with_limits(embed_limiter(), tokens, lambda _slot: embed(batch, chunk_size=batch_size)))
+        return out
+
+    def embed_query(self, text: str) -> list[float]:
+        embed = super().embed_documents
+        return call_with_limits(embed_limiter(), estimate_tokens(text), lambda _slot: embed([text]))[0]
+
+
+# クライアントはプロセス内で共有し、HTTP コネクションプールを再利用する
+# （リトライは call_with_limits 側で行い、429 をリミッタに反映させる）
+@lru_cache(maxsize=1)
 def get_chat_model() -> ChatOpenAI:
     return ChatOpenAI(
         api_key=settings.openai_api_key,
         model=settings.openai_chat_model,
+        base_url=settings.openai_base_url or None,
         temperature=0,
+        max_retries=0,
+        stream_usage=True,
     )
 
 
+@lru_cache(maxsize=1)
 def get_embeddings() -> OpenAIEmbeddings:
-    return OpenAIEmbeddings(
+    return RateLimitedOpenAIEmbeddings(
         api_key=settings.openai_api_key,
         model=settings.openai_embed_model,
+        base_url=settings.openai_base_url or None,
+        max_retries=0,
     )
-
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket for a per-minute quota.
+
+    - capacity is limited to `burst_seconds` worth of quota so callers are spread
+      over the minute instead of spending the whole quota in one burst
+    - requests larger than the capacity wait for a full bucket and then drive it
+      negative, so the long-run rate still matches the quota
+    - per_minute <= 0 disables the bucket
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0) -> None:
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float) -> float:
+        """Block until `amount` can be spent. Returns the time spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        need = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= need:
+                    self._tokens -= amount
+                    return waited
+                delay = (need - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, delta: float) -> None:
+        """Charge (delta > 0) or refund (delta < 0) tokens after the fact."""
+        if self.rate <= 0 or delta == 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+    def available(self) -> float:
+        if self.rate <= 0:
+            return float("inf")
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit:
+    - additive increase: +1 per `limit` successful calls under the latency target
+    - multiplicative decrease: on 429 (x backoff) or slow calls (x latency_backoff),
+      at most once per cooldown window so one burst of 429s only halves the limit once
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency_s: float = 0.0,
+        backoff: float = 0.5,
+        latency_backoff: float = 0.9,
+        cooldown_s: float = 2.0,
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency_s = target_latency_s
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.cooldown_s = cooldown_s
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency_s: float, rate_limited: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if rate_limited:
+                self._decrease(now, self.backoff)
+            elif self.target_latency_s > 0 and latency_s > self.target_latency_s:
+                self._decrease(now, self.latency_backoff)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self, now: float, factor: float) -> None:
+        if now - self._last_decrease < self.cooldown_s:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * factor)
+
+
+class CallSlot:
+    def __init__(self, reserved_tokens: int) -> None:
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens: int | None = None
+        self.rate_limited = False
+
+    def mark_rate_limited(self) -> None:
+        self.rate_limited = True
+
+    def record_usage(self, tokens: int | None) -> None:
+        """Actual tokens reported by the API; the reservation is reconciled against it on release."""
+        if tokens is not None:
+            self.used_tokens = tokens
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for one upstream quota (requests/min + tokens/min)
+    combined with an adaptive concurrency limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float,
+        tpm: float,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        target_latency_s: float = 0.0,
+    ) -> None:
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(
+            initial=max(min_concurrency, max_concurrency // 2),
+            minimum=min_concurrency,
+            maximum=max_concurrency,
+            target_latency_s=target_latency_s,
+        )
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.calls_total = 0
+        self.rate_limited_total = 0
+        self.wait_seconds_total = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every new call for `seconds` (e.g. from a Retry-After header)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _wait_pause(self) -> float:
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    @contextmanager
+    def slot(self, tokens: int) -> Iterator[CallSlot]:
+        start_wait = time.monotonic()
+        self._wait_pause()
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+        self.concurrency.acquire()
+        waited = time.monotonic() - start_wait
+
+        slot = CallSlot(tokens)
+        start = time.monotonic()
+        try:
+            yield slot
+        finally:
+            self.concurrency.release(time.monotonic() - start, rate_limited=slot.rate_limited)
+            if slot.used_tokens is not None:
+                self.tokens.adjust(slot.used_tokens - slot.reserved_tokens)
+            with self._lock:
+                self.calls_total += 1
+                self.wait_seconds_total += waited
+                if slot.rate_limited:
+                    self.rate_limited_total += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            paused_s = max(0.0, self._paused_until - time.monotonic())
+            calls_total = self.calls_total
+            rate_limited_total = self.rate_limited_total
+            wait_seconds_total = self.wait_seconds_total
+        return {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "calls_total": calls_total,
+            "rate_limited_total": rate_limited_total,
+            "wait_seconds_total": round(wait_seconds_total, 3),
+            "paused_seconds": round(paused_s, 3),
+        }
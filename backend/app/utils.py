@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import json
 import re
+from typing import Any
+from typing import Iterable
+from typing import Iterator
 
 
 def normalize_whitespace(text: str) -> str:
@@ -45,3 +49,43 @@ def choose_non_overlapping_spans(spans: list[tuple[int, int]]) -> list[tuple[int
         cursor = end
     return chosen
 
+
+def iter_streamed_json_objects(chunks: Iterable[str], depth: int = 2) -> Iterator[Any]:
+    """
+    Incrementally parse a streamed JSON document and yield every object nested
+    inside exactly `depth` containers as soon as its closing brace arrives.
+    e.g. depth=2 yields each element of {"symptoms": [{...}, {...}]}
+    Objects that fail to parse are skipped.
+    """
+    level = 0
+    in_string = False
+    escaped = False
+    capturing = False
+    buf: list[str] = []
+    for chunk in chunks:
+        for ch in chunk:
+            if capturing:
+                buf.append(ch)
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+                continue
+            if ch == '"':
+                in_string = True
+            elif ch in "{[":
+                if ch == "{" and level == depth and not capturing:
+                    capturing = True
+                    buf = [ch]
+                level += 1
+            elif ch in "}]":
+                level -= 1
+                if capturing and level == depth:
+                    capturing = False
+                    try:
+                        yield json.loads("".join(buf))
+                    except json.JSONDecodeError:
+                        continue
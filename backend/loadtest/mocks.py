@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import csv
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+from typing import AsyncIterator
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+
+# 合成 HPO 表の先頭に置く実在風の用語（負荷試験用テキストはこれらを含む）
+VOCABULARY: list[tuple[str, str, str]] = [
+    ("HP:0001945", "Fever", "発熱"),
+    ("HP:0012735", "Cough", "咳嗽"),
+    ("HP:0002315", "Headache", "頭痛"),
+    ("HP:0001250", "Seizure", "痙攣"),
+    ("HP:0002013", "Vomiting", "嘔吐"),
+    ("HP:0002027", "Abdominal pain", "腹痛"),
+    ("HP:0000988", "Skin rash", "発疹"),
+    ("HP:0001324", "Muscle weakness", "筋力低下"),
+    ("HP:0012378", "Fatigue", "倦怠感"),
+    ("HP:0002014", "Diarrhea", "下痢"),
+]
+
+SAMPLE_TEXT = (
+    "5歳男児。3日前から発熱と咳嗽が続き、昨日から頭痛と嘔吐を認めた。"
+    "腹痛の訴えあり。発疹なし。既往に痙攣があり、最近は倦怠感と筋力低下を自覚している。"
+)
+
+_HPO_ID_LINE = re.compile(r"^- (HP:\d{7})", re.MULTILINE)
+_EMBED_DIM = 256
+
+
+@dataclass
+class MockConfig:
+    openai_latency_ms: float = 300.0
+    openai_jitter_ms: float = 100.0
+    openai_rate_limit_ratio: float = 0.0
+    openai_retry_after_s: float = 1.0
+    stream_chunk_chars: int = 16
+    pubcasefinder_latency_ms: float = 200.0
+    pubcasefinder_jitter_ms: float = 50.0
+    seed: int = 0
+
+
+@dataclass
+class MockCounters:
+    chat_calls: int = 0
+    embed_calls: int = 0
+    rate_limited: int = 0
+    pubcasefinder_calls: int = 0
+
+
+def write_synthetic_hpo_csv(path: str, n_terms: int) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["HPO_ID", "name_en", "jp_final", "definition_ja"])
+        for hpo_id, name_en, name_ja in VOCABULARY:
+            writer.writerow([hpo_id, name_en, name_ja, f"{name_ja}を認める状態。"])
+        for i in range(max(0, n_terms - len(VOCABULARY))):
+            writer.writerow([f"HP:9{i:06d}", f"Synthetic phenotype {i}", f"合成所見{i}", f"負荷試験用の合成所見{i}。"])
+
+
+def _hashed_embedding(item: Any) -> list[float]:
+    # 文字(またはトークンID)の bigram を特徴ハッシュしたベクトル。似た文字列ほど近くなる
+    units = [str(u) for u in item] if isinstance(item, list) else list(str(item))
+    vec = np.zeros(_EMBED_DIM, dtype=np.float32)
+    for a, b in zip(units, units[1:] + [""]):
+        digest = hashlib.blake2b(f"{a}\0{b}".encode("utf-8"), digest_size=4).digest()
+        vec[int.from_bytes(digest, "little") % _EMBED_DIM] += 1.0
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec.tolist()
+
+
+def _extract_symptoms(prompt: str) -> dict:
+    body = prompt.split("本文:\n", 1)[-1]
+    symptoms = []
+    for _, _, name_ja in VOCABULARY:
+        start = body.find(name_ja)
+        if start < 0:
+            continue
+        span = {"start": start, "end": start + len(name_ja), "text": name_ja}
+        symptoms.append({"symptom": name_ja, "spans": [span], "negated_spans": []})
+    return {"symptoms": symptoms}
+
+
+def _choose_hpo(prompt: str) -> dict:
+    m = _HPO_ID_LINE.search(prompt)
+    return {"hpo_id": m.group(1) if m else None}
+
+
+def create_openai_mock(config: MockConfig, counters: MockCounters) -> FastAPI:
+    app = FastAPI(title="OpenAI mock")
+    rng = random.Random(config.seed)
+
+    async def _delay() -> None:
+        latency = max(0.0, rng.gauss(config.openai_latency_ms, config.openai_jitter_ms)) / 1000.0
+        await asyncio.sleep(latency)
+
+    def _rate_limited() -> JSONResponse | None:
+        if config.openai_rate_limit_ratio <= 0 or rng.random() >= config.openai_rate_limit_ratio:
+            return None
+        counters.rate_limited += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+            headers={"retry-after": str(config.openai_retry_after_s)},
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        counters.chat_calls += 1
+        rejected = _rate_limited()
+        if rejected is not None:
+            return rejected
+
+        body = await request.json()
+        prompt = str(body["messages"][-1].get("content") or "")
+        model = body.get("model", "mock")
+        tools = body.get("tools") or []
+        tool_name = tools[0]["function"]["name"] if tools else None
+        payload = _choose_hpo(prompt) if "候補:" in prompt else _extract_symptoms(prompt)
+        content = json.dumps(payload, ensure_ascii=False)
+        usage = {"prompt_tokens": len(prompt), "completion_tokens": len(content), "total_tokens": len(prompt) + len(content)}
+
+        if body.get("stream"):
+            return StreamingResponse(_stream_chunks(content, model), media_type="text/event-stream")
+
+        await _delay()
+        message: dict[str, Any] = {"role": "assistant", "content": content}
+        finish_reason = "stop"
+        if tool_name:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": "call_mock", "type": "function", "function": {"name": tool_name, "arguments": content}}
+                ],
+            }
+            finish_reason = "tool_calls"
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    async def _stream_chunks(content: str, model: str) -> AsyncIterator[str]:
+        # 応答全体のレイテンシをチャンク間に分散させる
+        size = max(1, config.stream_chunk_chars)
+        pieces = [content[i : i + size] for i in range(0, len(content), size)] or [""]
+        latency = max(0.0, rng.gauss(config.openai_latency_ms, config.openai_jitter_ms)) / 1000.0
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(latency / len(pieces))
+            delta: dict[str, Any] = {"content": piece}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        done = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> Any:
+        counters.embed_calls += 1
+        rejected = _rate_limited()
+        if rejected is not None:
+            return rejected
+
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        await _delay()
+        as_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for i, item in enumerate(inputs):
+            vector = _hashed_embedding(item)
+            if as_base64:
+                encoded: Any = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            else:
+                encoded = vector
+            data.append({"object": "embedding", "index": i, "embedding": encoded})
+        n_tokens = sum(len(x) for x in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "mock"),
+            "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens},
+        }
+
+    return app
+
+
+def create_pubcasefinder_mock(config: MockConfig, counters: MockCounters) -> FastAPI:
+    app = FastAPI(title="PubCaseFinder mock")
+    rng = random.Random(config.seed + 1)
+
+    @app.get("/pcf_get_ranked_list")
+    async def ranked_list(target: str = "omim", hpo_id: str = "", format: str = "json") -> list[dict]:
+        counters.pubcasefinder_calls += 1
+        latency = max(0.0, rng.gauss(config.pubcasefinder_latency_ms, config.pubcasefinder_jitter_ms)) / 1000.0
+        await asyncio.sleep(latency)
+        out = []
+        for rank in range(1, 51):
+            item = {
+                "id": f"OMIM:{600000 + rank}",
+                "rank": rank,
+                "score": round(1.0 / rank, 4),
+                "matched_hpo_id": hpo_id,
+            }
+            if target == "omim":
+                item.update(
+                    omim_disease_name_en=f"Mock disease {rank}",
+                    omim_disease_name_ja=f"模擬疾患{rank}",
+                    omim_url=f"https://omim.org/entry/{600000 + rank}",
+                )
+            elif target == "orphanet":
+                item.update(
+                    orpha_disease_name_en=f"Mock disease {rank}",
+                    orpha_disease_name_ja=f"模擬疾患{rank}",
+                    orpha_url=f"https://www.orpha.net/{rank}",
+                )
+            out.append(item)
+        return out
+
+    return app
+
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn on a daemon thread."""
+
+    def __init__(self, app: FastAPI, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name=f"mock_{port}", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout_s: float = 10.0) -> None:
+        self._thread.start()
+        deadline = time.monotonic() + timeout_s
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Mock server on port {self.port} failed to start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
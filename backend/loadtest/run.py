@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from dataclasses import field
+
+import httpx
+
+from .mocks import SAMPLE_TEXT
+from .mocks import VOCABULARY
+from .mocks import BackgroundServer
+from .mocks import MockConfig
+from .mocks import MockCounters
+from .mocks import create_openai_mock
+from .mocks import create_pubcasefinder_mock
+from .mocks import write_synthetic_hpo_csv
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("loadtest")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("extract", "predict")
+METRICS = ("p50", "p95", "p99")
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: int
+    latency_s: float
+
+
+@dataclass
+class SLO:
+    endpoint: str
+    metric: str
+    limit_ms: float
+
+
+@dataclass
+class EndpointReport:
+    requests: int = 0
+    ok: int = 0
+    statuses: dict[str, int] = field(default_factory=dict)
+    throughput_rps: float = 0.0
+    latency_ms: dict[str, float | None] = field(default_factory=dict)
+
+    @property
+    def error_rate(self) -> float:
+        return (self.requests - self.ok) / self.requests if self.requests else 0.0
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    # nearest-rank
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), int(-(-q * len(sorted_values) // 100))))
+    return sorted_values[rank - 1]
+
+
+def _parse_slo(raw: str) -> SLO:
+    # 形式: extract:p99=8000
+    try:
+        target, limit = raw.split("=", 1)
+        endpoint, metric = target.split(":", 1)
+        slo = SLO(endpoint=endpoint.strip(), metric=metric.strip(), limit_ms=float(limit))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid SLO '{raw}' (expected ENDPOINT:METRIC=MS, e.g. extract:p99=8000)")
+    if slo.endpoint not in ENDPOINTS or slo.metric not in METRICS:
+        raise argparse.ArgumentTypeError(f"invalid SLO '{raw}' (endpoint: {ENDPOINTS}, metric: {METRICS})")
+    return slo
+
+
+def _predict_hpo_ids(rng: random.Random) -> list[str]:
+    ids = [hpo_id for hpo_id, _, _ in VOCABULARY]
+    return rng.sample(ids, k=rng.randint(2, 5))
+
+
+async def _send(client: httpx.AsyncClient, endpoint: str, args: argparse.Namespace, rng: random.Random) -> Sample:
+    start = time.monotonic()
+    try:
+        if endpoint == "extract":
+            r = await client.post(
+                "/api/extract",
+                json={"text": args.text},
+                headers={"X-Priority": args.priority},
+            )
+        else:
+            r = await client.post(
+                "/api/predict",
+                json={"hpo_ids": _predict_hpo_ids(rng), "target": "omim", "limit": 20},
+            )
+        status = r.status_code
+    except httpx.HTTPError as e:
+        logger.debug(f"{endpoint} request failed: {e}")
+        status = 0
+    return Sample(endpoint=endpoint, status=status, latency_s=time.monotonic() - start)
+
+
+def _pick_endpoint(args: argparse.Namespace, rng: random.Random) -> str:
+    return "predict" if rng.random() < args.predict_ratio else "extract"
+
+
+async def _run_closed_loop(client: httpx.AsyncClient, args: argparse.Namespace) -> list[Sample]:
+    samples: list[Sample] = []
+    deadline = time.monotonic() + args.duration
+
+    async def _worker(worker_id: int) -> None:
+        rng = random.Random(args.seed + worker_id)
+        while time.monotonic() < deadline:
+            samples.append(await _send(client, _pick_endpoint(args, rng), args, rng))
+
+    await asyncio.gather(*[_worker(i) for i in range(args.concurrency)])
+    return samples
+
+
+async def _run_open_loop(client: httpx.AsyncClient, args: argparse.Namespace) -> tuple[list[Sample], int]:
+    # ポアソン到着。in-flight が concurrency を超える到着はクライアント側で破棄して数える
+    rng = random.Random(args.seed)
+    samples: list[Sample] = []
+    tasks: set[asyncio.Task[None]] = set()
+    dropped = 0
+    deadline = time.monotonic() + args.duration
+
+    async def _one(endpoint: str) -> None:
+        samples.append(await _send(client, endpoint, args, rng))
+
+    while True:
+        await asyncio.sleep(rng.expovariate(args.rate))
+        if time.monotonic() >= deadline:
+            break
+        if len(tasks) >= args.concurrency:
+            dropped += 1
+            continue
+        task = asyncio.create_task(_one(_pick_endpoint(args, rng)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return samples, dropped
+
+
+def _build_report(samples: list[Sample], elapsed_s: float) -> dict[str, EndpointReport]:
+    reports: dict[str, EndpointReport] = {}
+    for endpoint in ENDPOINTS:
+        mine = [s for s in samples if s.endpoint == endpoint]
+        if not mine:
+            continue
+        ok_latencies = sorted(s.latency_s * 1000.0 for s in mine if 200 <= s.status < 300)
+        reports[endpoint] = EndpointReport(
+            requests=len(mine),
+            ok=len(ok_latencies),
+            statuses={str(k): v for k, v in sorted(Counter(s.status for s in mine).items())},
+            throughput_rps=len(ok_latencies) / elapsed_s if elapsed_s > 0 else 0.0,
+            latency_ms={m: _percentile(ok_latencies, float(m[1:])) for m in METRICS},
+        )
+    return reports
+
+
+def _check_slos(reports: dict[str, EndpointReport], slos: list[SLO], max_error_rate: float) -> list[str]:
+    violations: list[str] = []
+    for slo in slos:
+        report = reports.get(slo.endpoint)
+        value = report.latency_ms.get(slo.metric) if report else None
+        if value is None:
+            violations.append(f"{slo.endpoint}:{slo.metric} has no successful samples")
+        elif value > slo.limit_ms:
+            violations.append(f"{slo.endpoint}:{slo.metric}={value:.0f}ms exceeds {slo.limit_ms:.0f}ms")
+    for endpoint, report in reports.items():
+        if report.error_rate > max_error_rate:
+            violations.append(f"{endpoint} error rate {report.error_rate:.2%} exceeds {max_error_rate:.2%}")
+    return violations
+
+
+def _print_report(reports: dict[str, EndpointReport], elapsed_s: float, dropped: int) -> None:
+    print(f"\nduration: {elapsed_s:.1f}s, client-side dropped arrivals: {dropped}")
+    print(f"{'endpoint':<10}{'requests':>10}{'ok':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for endpoint, r in reports.items():
+        lat = [f"{r.latency_ms[m]:.0f}" if r.latency_ms[m] is not None else "-" for m in METRICS]
+        print(
+            f"{endpoint:<10}{r.requests:>10}{r.ok:>8}{r.throughput_rps:>9.2f}"
+            f"{lat[0]:>10}{lat[1]:>10}{lat[2]:>10}  {r.statuses}"
+        )
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout_s: float, app_proc: subprocess.Popen) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if app_proc.poll() is not None:
+            raise RuntimeError(f"backend exited during startup (code {app_proc.returncode})")
+        try:
+            r = await client.get("/health")
+        except httpx.HTTPError:
+            r = None
+        if r is not None and r.status_code == 200:
+            health = r.json()
+            if health.get("store_ready"):
+                return
+            if health.get("store_error"):
+                raise RuntimeError(f"backend store failed to initialize: {health['store_error']}")
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"backend did not become ready within {timeout_s:.0f}s")
+
+
+async def _drive(base_url: str, args: argparse.Namespace, app_proc: subprocess.Popen) -> tuple[list[Sample], float, int]:
+    limits = httpx.Limits(max_connections=args.concurrency + 8, max_keepalive_connections=args.concurrency + 8)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        await _wait_ready(client, args.startup_timeout, app_proc)
+        logger.info(
+            f"Driving load for {args.duration:.0f}s "
+            f"({'open loop, %.2f req/s' % args.rate if args.rate else 'closed loop'}, concurrency={args.concurrency})"
+        )
+        start = time.monotonic()
+        if args.rate:
+            samples, dropped = await _run_open_loop(client, args)
+        else:
+            samples, dropped = await _run_closed_loop(client, args), 0
+        return samples, time.monotonic() - start, dropped
+
+
+def _start_backend(port: int, openai_url: str, pcf_url: str, csv_path: str, faiss_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-loadtest",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "PUBCASEFINDER_BASE_URL": pcf_url,
+        "HPO_CSV_PATH": csv_path,
+        "FAISS_DIR": faiss_dir,
+        "REBUILD_FAISS_ON_STARTUP": "false",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load-test the backend against local OpenAI / PubCaseFinder stand-ins.",
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Load phase length in seconds.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop workers, or max in-flight for --rate.")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop Poisson arrival rate (req/s). 0 = closed loop.")
+    parser.add_argument("--predict-ratio", type=float, default=0.3, help="Share of requests sent to /api/predict.")
+    parser.add_argument("--priority", choices=["interactive", "bulk"], default="interactive", help="X-Priority for extract.")
+    parser.add_argument("--text", default=SAMPLE_TEXT, help="Text sent to /api/extract.")
+    parser.add_argument("--hpo-terms", type=int, default=2000, help="Rows in the synthetic HPO CSV.")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--openai-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--openai-429-ratio", type=float, default=0.0, help="Share of OpenAI calls answered with 429.")
+    parser.add_argument("--openai-retry-after-s", type=float, default=1.0)
+    parser.add_argument("--pubcasefinder-latency-ms", type=float, default=200.0)
+    parser.add_argument(
+        "--slo",
+        type=_parse_slo,
+        action="append",
+        default=[],
+        help="Latency gate ENDPOINT:METRIC=MS (e.g. extract:p99=8000). Repeatable.",
+    )
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Fail if any endpoint's non-2xx share exceeds this.")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    counters = MockCounters()
+    mock_config = MockConfig(
+        openai_latency_ms=args.openai_latency_ms,
+        openai_jitter_ms=args.openai_jitter_ms,
+        openai_rate_limit_ratio=args.openai_429_ratio,
+        openai_retry_after_s=args.openai_retry_after_s,
+        pubcasefinder_latency_ms=args.pubcasefinder_latency_ms,
+        seed=args.seed,
+    )
+    openai_mock = BackgroundServer(create_openai_mock(mock_config, counters), "127.0.0.1", _free_port())
+    pcf_mock = BackgroundServer(create_pubcasefinder_mock(mock_config, counters), "127.0.0.1", _free_port())
+    openai_mock.start()
+    pcf_mock.start()
+
+    with tempfile.TemporaryDirectory(prefix="hpo_loadtest_") as tmp:
+        csv_path = os.path.join(tmp, "HPO_depth_ge3.csv")
+        write_synthetic_hpo_csv(csv_path, args.hpo_terms)
+        app_port = _free_port()
+        app_proc = _start_backend(app_port, openai_mock.url, pcf_mock.url, csv_path, os.path.join(tmp, "faiss"))
+        try:
+            samples, elapsed_s, dropped = asyncio.run(_drive(f"http://127.0.0.1:{app_port}", args, app_proc))
+        finally:
+            app_proc.terminate()
+            app_proc.wait(timeout=10)
+            openai_mock.stop()
+            pcf_mock.stop()
+
+    reports = _build_report(samples, elapsed_s)
+    _print_report(reports, elapsed_s, dropped)
+    print(
+        f"upstream calls: chat={counters.chat_calls}, embed={counters.embed_calls}, "
+        f"injected_429={counters.rate_limited}, pubcasefinder={counters.pubcasefinder_calls}"
+    )
+
+    violations = _check_slos(reports, args.slo, args.max_error_rate)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "duration_s": elapsed_s,
+                    "dropped": dropped,
+                    "endpoints": {
+                        k: {**v.__dict__, "error_rate": v.error_rate} for k, v in reports.items()
+                    },
+                    "violations": violations,
+                },
+                f,
+                indent=2,
+            )
+
+    if violations:
+        for v in violations:
+            logger.error(f"SLO violated: {v}")
+        sys.exit(1)
+    logger.info("All SLO gates passed")
+
+
+if __name__ == "__main__":
+    main()
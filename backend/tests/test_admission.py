@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController
+from app.admission import AdmissionRejected
+
+
+def _controller(
+    max_concurrency: int = 2,
+    interactive_reserved: int = 1,
+    max_queue: int = 10,
+    timeout_s: float = 5.0,
+) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=max_concurrency,
+        interactive_reserved=interactive_reserved,
+        max_queue={"interactive": max_queue, "bulk": max_queue},
+        queue_timeout_s={"interactive": timeout_s, "bulk": timeout_s},
+    )
+
+
+def test_interactive_dispatched_before_bulk() -> None:
+    async def scenario() -> list[str]:
+        c = _controller(max_concurrency=1, interactive_reserved=0)
+        order: list[str] = []
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with c.admit("bulk"):
+                await release.wait()
+
+        async def request(name: str, priority: str) -> None:
+            async with c.admit(priority):  # type: ignore[arg-type]
+                order.append(name)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(request("bulk-1", "bulk")),
+            asyncio.create_task(request("bulk-2", "bulk")),
+        ]
+        await asyncio.sleep(0)
+        waiters.append(asyncio.create_task(request("interactive-1", "interactive")))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive-1", "bulk-1", "bulk-2"]
+
+
+def test_bulk_cannot_take_reserved_interactive_slot() -> None:
+    async def scenario() -> dict:
+        c = _controller(max_concurrency=2, interactive_reserved=1)
+        release = asyncio.Event()
+
+        async def hold(priority: str) -> None:
+            async with c.admit(priority):  # type: ignore[arg-type]
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold("bulk")), asyncio.create_task(hold("bulk"))]
+        await asyncio.sleep(0)
+        stats = c.stats()
+        tasks.append(asyncio.create_task(hold("interactive")))
+        await asyncio.sleep(0)
+        stats_after = c.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return {"before": stats, "after": stats_after}
+
+    out = asyncio.run(scenario())
+    assert out["before"]["classes"]["bulk"]["active"] == 1
+    assert out["before"]["classes"]["bulk"]["queue_depth"] == 1
+    assert out["after"]["classes"]["interactive"]["active"] == 1
+
+
+def test_full_queue_rejected_with_429() -> None:
+    async def scenario() -> AdmissionRejected:
+        c = _controller(max_concurrency=1, interactive_reserved=0, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with c.admit("bulk"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()), asyncio.create_task(hold())]
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(AdmissionRejected) as exc_info:
+                async with c.admit("bulk"):
+                    pass
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+        assert c.stats()["classes"]["bulk"]["rejected_queue_full_total"] == 1
+        return exc_info.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert int(rejected.retry_after_header) >= 1
+
+
+def test_queue_deadline_rejected_with_503() -> None:
+    async def scenario() -> AdmissionRejected:
+        c = _controller(max_concurrency=1, interactive_reserved=0, timeout_s=0.05)
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with c.admit("bulk"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(AdmissionRejected) as exc_info:
+                async with c.admit("bulk"):
+                    pass
+        finally:
+            release.set()
+            await holder
+        stats = c.stats()["classes"]["bulk"]
+        assert stats["rejected_deadline_total"] == 1
+        assert stats["queue_depth"] == 0
+        return exc_info.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_cancelled_waiter_does_not_leak_slot_or_sample() -> None:
+    async def scenario() -> AdmissionController:
+        c = _controller(max_concurrency=1, interactive_reserved=0)
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with c.admit("bulk"):
+                await release.wait()
+
+        async def wait_forever() -> None:
+            async with c.admit("bulk"):
+                await asyncio.Event().wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait_forever())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await holder
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return c
+
+    c = asyncio.run(scenario())
+    stats = c.stats()
+    assert stats["classes"]["bulk"]["active"] == 0
+    assert stats["classes"]["bulk"]["queue_depth"] == 0
+
+
+def test_cancel_after_slot_handed_releases_without_service_sample() -> None:
+    async def scenario() -> tuple[float | None, AdmissionController]:
+        c = _controller(max_concurrency=1, interactive_reserved=0)
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with c.admit("bulk"):
+                await release.wait()
+
+        async def wait_then_run() -> None:
+            async with c.admit("bulk"):
+                pass
+
+        holder = asyncio.create_task(hold())
+        # holder の処理時間(~0.1s)と waiter のキュー待ち(~0s)を大きく変えておく
+        await asyncio.sleep(0.1)
+        waiter = asyncio.create_task(wait_then_run())
+        await asyncio.sleep(0)
+        release.set()
+        await holder
+        # holder の解放で waiter に枠が渡った直後（waiter 再開前）にキャンセルする
+        ewma_before = c.stats()["service_ewma_s"]
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert c.stats()["service_ewma_s"] == ewma_before
+        return ewma_before, c
+
+    ewma, c = asyncio.run(scenario())
+    assert ewma is not None
+    assert c.stats()["classes"]["bulk"]["active"] == 0
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import graph
+from app.config import settings
+from app.schemas import NormalizedSymptom
+
+
+class _FakeModel:
+    def bind(self, **kwargs):
+        return self
+
+
+def _symptom_chunks(*names: str) -> list[str]:
+    # 症状オブジェクト1つ = 1 チャンク
+    objs = [json.dumps({"symptom": n, "spans": [], "negated_spans": []}, ensure_ascii=False) for n in names]
+    return ['{"symptoms": [', *[o + ("," if i < len(objs) - 1 else "") for i, o in enumerate(objs)], "]}"]
+
+
+def _state(text: str = "発熱と頭痛と咳"):
+    return {"text": text, "extracted": [], "normalized": []}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    monkeypatch.setattr(graph, "get_chat_model", lambda: _FakeModel())
+    monkeypatch.setattr(settings, "normalize_workers", 2)
+    normalized: list[str] = []
+    lock = threading.Lock()
+
+    def _normalize(text, s):
+        with lock:
+            normalized.append(s.symptom)
+        return NormalizedSymptom(symptom=s.symptom, spans=[], evidence="")
+
+    monkeypatch.setattr(graph, "_normalize_symptom", _normalize)
+    return normalized
+
+
+def test_normalization_starts_before_stream_finishes(calls, monkeypatch):
+    first_normalized = threading.Event()
+    original = graph._normalize_symptom
+
+    def _normalize(text, s):
+        out = original(text, s)
+        first_normalized.set()
+        return out
+
+    monkeypatch.setattr(graph, "_normalize_symptom", _normalize)
+    waited_for_normalize: list[bool] = []
+
+    def _stream(chunks):
+        head, first, *rest = chunks
+        yield head
+        yield first
+        # 2 件目以降を流す前に、1 件目の正規化が始まっていること
+        waited_for_normalize.append(first_normalized.wait(timeout=2.0))
+        yield from rest
+
+    def fake_stream_chat(model, prompt, consume):
+        return consume(_stream(_symptom_chunks("発熱", "頭痛")))
+
+    monkeypatch.setattr(graph, "stream_chat", fake_stream_chat)
+    out = graph._extract_and_normalize_node(_state())
+
+    assert waited_for_normalize == [True]
+    assert sorted(n.symptom for n in out["normalized"]) == ["発熱", "頭痛"]
+
+
+def test_retried_stream_does_not_renormalize_submitted_symptoms(calls, monkeypatch):
+    def _broken(chunks):
+        yield from chunks[:3]
+        raise ConnectionError("stream dropped")
+
+    def fake_stream_chat(model, prompt, consume):
+        # call_with_limits と同様、失敗したら新しいストリームで consume を呼び直す
+        try:
+            return consume(_broken(_symptom_chunks("発熱", "発熱", "頭痛")))
+        except ConnectionError:
+            return consume(iter(_symptom_chunks("発熱", "発熱", "頭痛")))
+
+    monkeypatch.setattr(graph, "stream_chat", fake_stream_chat)
+    out = graph._extract_and_normalize_node(_state())
+
+    # 同名の症状は逐次モードと同様に残し、リトライで再送された分だけを除く
+    assert sorted(calls) == ["発熱", "発熱", "頭痛"]
+    assert [s.symptom for s in out["extracted"]] == ["発熱", "発熱", "頭痛"]
+    assert len(out["normalized"]) == 3
+
+
+def test_stream_failure_does_not_wait_for_queued_normalizations(calls, monkeypatch):
+    monkeypatch.setattr(settings, "normalize_workers", 1)
+    release = threading.Event()
+    started: list[str] = []
+
+    def _blocking_normalize(text, s):
+        started.append(s.symptom)
+        release.wait(timeout=5.0)
+        return NormalizedSymptom(symptom=s.symptom, spans=[], evidence="")
+
+    monkeypatch.setattr(graph, "_normalize_symptom", _blocking_normalize)
+
+    def _failing(chunks):
+        yield from chunks[:3]
+        raise RuntimeError("extraction failed")
+
+    monkeypatch.setattr(
+        graph,
+        "stream_chat",
+        lambda model, prompt, consume: consume(_failing(_symptom_chunks("発熱", "頭痛", "咳"))),
+    )
+
+    start = time.monotonic()
+    try:
+        with pytest.raises(RuntimeError, match="extraction failed"):
+            graph._extract_and_normalize_node(_state())
+        assert time.monotonic() - start < 1.0
+    finally:
+        release.set()
+    time.sleep(0.05)
+    # キュー待ちだった正規化は取り消され、実行されない
+    assert "頭痛" not in started and "咳" not in started
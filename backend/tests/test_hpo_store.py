@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app import hpo_store
+from app.config import settings
+from app.hpo_store import HPOEntry
+from app.hpo_store import HPOTermTable
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic 4-d vectors; `hooks[text]` runs before the batch containing `text` is embedded."""
+
+    def __init__(self, hooks: dict | None = None) -> None:
+        self.hooks = hooks or {}
+        self.embedded: list[str] = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        for text in texts:
+            hook = self.hooks.get(text)
+            if hook is not None:
+                hook()
+        with self._lock:
+            self.embedded.extend(texts)
+        return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0, 0.0] for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+TRICKY_ENTRIES = [
+    HPOEntry("HP:0000001", "Seizure", "けいれん", "発作性の異常な電気活動"),
+    # ラベル自体に区切り文字列を含む
+    HPOEntry("HP:0000002", "a\n  定義:b", "x\n  英語:y", "z\n  日本語:w\n  定義:v"),
+    HPOEntry("HP:0000003", "", "空ラベル", ""),
+    HPOEntry("HP:0000004", "", "", ""),
+    # サロゲートペアが必要な文字（非 BMP）
+    HPOEntry("HP:0000005", "smile 😀", "𠮷野家𩸽", "🧬 定義 𝒜"),
+]
+
+
+def _old_prompt_text(candidates: list[HPOEntry]) -> str:
+    return "\n\n".join(
+        [
+            f"- {c.hpo_id}\n  日本語:{c.label_ja}\n  英語:{c.label_en}\n  定義:{c.definition_ja}"
+            for c in candidates
+        ]
+    )
+
+
+def test_term_table_round_trips_entries():
+    table = HPOTermTable(TRICKY_ENTRIES)
+    assert len(table) == len(TRICKY_ENTRIES)
+    for e in TRICKY_ENTRIES:
+        row = table.row(e.hpo_id)
+        assert table.hpo_id(row) == e.hpo_id
+        assert table.entry(row) == e
+    assert table.row("HP:9999999") == -1
+
+
+def test_term_table_keeps_last_duplicate_in_first_position():
+    first = HPOEntry("HP:0000010", "old", "旧", "旧定義")
+    other = HPOEntry("HP:0000011", "other", "他", "")
+    last = HPOEntry("HP:0000010", "new label", "新しいラベル", "新定義")
+    table = HPOTermTable([first, other, last])
+    assert len(table) == 2
+    assert table.row("HP:0000010") == 0
+    assert table.entry(0) == last
+    assert table.entry(1) == other
+
+
+def test_prompt_text_matches_original_candidate_format():
+    table = HPOTermTable(TRICKY_ENTRIES)
+    rows = [4, 1, 0, 3]
+    assert table.prompt_text(rows) == _old_prompt_text([TRICKY_ENTRIES[r] for r in rows])
+    assert table.prompt_text([2]) == _old_prompt_text([TRICKY_ENTRIES[2]])
+    assert table.prompt_text([]) == ""
+
+
+def _docs(n: int):
+    entries = [HPOEntry(f"HP:{i:07d}", f"label {i}", f"所見{i}", f"定義{i}") for i in range(n)]
+    return hpo_store._entries_to_documents(entries)
+
+
+@pytest.fixture
+def build_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "faiss_dir", str(tmp_path / "faiss"))
+    monkeypatch.setattr(settings, "faiss_shard_size", 2)
+    monkeypatch.setattr(settings, "faiss_build_workers", 2)
+
+
+def test_sharded_build_reports_progress_while_shards_are_running(build_settings):
+    docs = _docs(4)
+    slow_shard_may_finish = threading.Event()
+    timed_out: list[bool] = []
+    embeddings = FakeEmbeddings(
+        {docs[2].page_content: lambda: timed_out.append(not slow_shard_may_finish.wait(timeout=2.0))}
+    )
+    progress: list[hpo_store.BuildProgress] = []
+
+    def on_progress(p: hpo_store.BuildProgress) -> None:
+        progress.append(p)
+        if p.shards_done == 1:
+            # 速いシャードの完了は遅いシャードの完了前に報告されるはず
+            slow_shard_may_finish.set()
+
+    store = hpo_store._build_store_sharded(docs, embeddings, on_progress=on_progress)
+
+    assert timed_out == [False]
+    assert [p.shards_done for p in progress] == [0, 1, 2]
+    assert progress[-1].docs_done == 4
+    assert store.index.ntotal == 4
+
+
+def test_failed_build_resumes_from_checkpoints(build_settings, monkeypatch):
+    monkeypatch.setattr(settings, "faiss_build_workers", 1)
+    docs = _docs(6)
+
+    def _fail() -> None:
+        raise RuntimeError("upstream down")
+
+    first = FakeEmbeddings({docs[2].page_content: _fail})
+    with pytest.raises(RuntimeError, match="upstream down"):
+        hpo_store._build_store_sharded(docs, first)
+    # 失敗前に着手済みだったシャードはチェックポイントされうる
+    checkpointed = set(first.embedded)
+    assert {d.page_content for d in docs[:2]} <= checkpointed
+    assert docs[2].page_content not in checkpointed
+
+    second = FakeEmbeddings()
+    progress: list[hpo_store.BuildProgress] = []
+    store = hpo_store._build_store_sharded(docs, second, on_progress=progress.append)
+
+    # 保存済みのシャードは再計算せず、欠けているシャードだけを埋め込む
+    assert sorted(second.embedded) == sorted(d.page_content for d in docs if d.page_content not in checkpointed)
+    assert progress[0].docs_resumed == len(checkpointed)
+    assert progress[-1].docs_done == 6
+    assert store.index.ntotal == 6
@@ -0,0 +1,80 @@
+import argparse
+
+import pytest
+
+from loadtest.run import SLO
+from loadtest.run import EndpointReport
+from loadtest.run import _check_slos
+from loadtest.run import _parse_slo
+from loadtest.run import _percentile
+
+
+def test_percentile_nearest_rank():
+    assert _percentile([], 99) is None
+    assert _percentile([7.0], 50) == 7.0
+    assert _percentile([7.0], 99) == 7.0
+
+    values = [float(v) for v in range(1, 101)]
+    assert _percentile(values, 50) == 50.0
+    assert _percentile(values, 95) == 95.0
+    assert _percentile(values, 99) == 99.0
+    assert _percentile(values, 100) == 100.0
+    # rank は 1 未満に丸めない
+    assert _percentile(values, 0) == 1.0
+
+    # ceil(0.99 * 101) = 100
+    assert _percentile([float(v) for v in range(1, 102)], 99) == 100.0
+    assert _percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert _percentile([1.0, 2.0, 3.0, 4.0], 51) == 3.0
+
+
+def test_parse_slo():
+    assert _parse_slo("extract:p99=8000") == SLO(endpoint="extract", metric="p99", limit_ms=8000.0)
+    assert _parse_slo(" predict : p50 =250.5") == SLO(endpoint="predict", metric="p50", limit_ms=250.5)
+
+
+@pytest.mark.parametrize(
+    "raw",
+    ["extract:p99", "extract=8000", "extract:p99=fast", "search:p99=100", "extract:p90=100", ""],
+)
+def test_parse_slo_rejects_malformed(raw):
+    with pytest.raises(argparse.ArgumentTypeError):
+        _parse_slo(raw)
+
+
+def _report(requests: int, ok: int, **latency_ms: float | None) -> EndpointReport:
+    return EndpointReport(requests=requests, ok=ok, latency_ms={"p50": None, "p95": None, "p99": None, **latency_ms})
+
+
+def test_check_slos_passes_within_limits():
+    reports = {"extract": _report(100, 100, p50=900.0, p99=7999.0)}
+    slos = [SLO("extract", "p99", 8000.0), SLO("extract", "p50", 1000.0)]
+    assert _check_slos(reports, slos, max_error_rate=0.01) == []
+
+
+def test_check_slos_flags_latency_over_limit():
+    reports = {"extract": _report(100, 100, p99=8001.0)}
+    violations = _check_slos(reports, [SLO("extract", "p99", 8000.0)], max_error_rate=0.01)
+    assert violations == ["extract:p99=8001ms exceeds 8000ms"]
+
+
+def test_check_slos_flags_missing_samples():
+    # 全件失敗した場合と、エンドポイント自体が未計測の場合
+    reports = {"extract": _report(10, 0)}
+    slos = [SLO("extract", "p99", 8000.0), SLO("predict", "p95", 500.0)]
+    violations = _check_slos(reports, slos, max_error_rate=1.0)
+    assert violations == [
+        "extract:p99 has no successful samples",
+        "predict:p95 has no successful samples",
+    ]
+
+
+def test_check_slos_error_rate_gate():
+    reports = {
+        "extract": _report(100, 99, p99=100.0),
+        "predict": _report(100, 98, p99=100.0),
+    }
+    # 上限ちょうどは許容し、超えたエンドポイントだけを報告する
+    violations = _check_slos(reports, [], max_error_rate=0.01)
+    assert violations == ["predict error rate 2.00% exceeds 1.00%"]
+    assert _check_slos({"extract": _report(0, 0)}, [], max_error_rate=0.0) == []
@@ -0,0 +1,151 @@
+import httpx
+import pytest
+import tenacity.nap
+from openai import InternalServerError
+from openai import RateLimitError
+
+from app import rate_limit
+from app.config import settings
+from app.openai_clients import call_with_limits
+from app.rate_limit import AdaptiveConcurrency
+from app.rate_limit import RateLimiter
+from app.rate_limit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", c)
+    monkeypatch.setattr(tenacity.nap, "time", c)
+    return c
+
+
+def _error(cls, status_code: int, headers: dict | None = None):
+    request = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return cls("upstream error", response=response, body=None)
+
+
+def test_bucket_waits_for_full_capacity_before_oversized_request(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)  # 1 token/s, capacity 10
+    assert bucket.acquire(5) == 0.0
+
+    # 容量を超える要求は満タンになるまで待ってから負債を作る
+    assert bucket.acquire(25) == pytest.approx(5.0)
+    assert bucket.available() == pytest.approx(-15.0)
+
+    assert bucket.acquire(1) == pytest.approx(16.0)
+    assert clock.sleeps == pytest.approx([5.0, 16.0])
+
+
+def test_bucket_adjust_refunds_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)
+    bucket.acquire(8)
+    bucket.adjust(-100)
+    assert bucket.available() == pytest.approx(10.0)
+    bucket.adjust(4)
+    assert bucket.available() == pytest.approx(6.0)
+
+
+def test_concurrency_halves_once_per_cooldown_window(clock):
+    limiter = AdaptiveConcurrency(initial=8, minimum=1, maximum=16, cooldown_s=2.0)
+    for _ in range(5):
+        limiter.acquire()
+    for _ in range(5):
+        limiter.release(0.1, rate_limited=True)
+    assert limiter.limit == pytest.approx(4.0)
+
+    clock.now += 1.0
+    limiter.acquire()
+    limiter.release(0.1, rate_limited=True)
+    assert limiter.limit == pytest.approx(4.0)
+
+    clock.now += 1.5
+    limiter.acquire()
+    limiter.release(0.1, rate_limited=True)
+    assert limiter.limit == pytest.approx(2.0)
+
+
+def test_concurrency_increases_additively(clock):
+    limiter = AdaptiveConcurrency(initial=4, minimum=1, maximum=16, target_latency_s=1.0)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.1)
+    # 1 ラウンド（limit 回の成功）でおよそ +1
+    assert 4.9 < limiter.limit < 5.0
+
+    before = limiter.limit
+    limiter.acquire()
+    limiter.release(5.0)
+    assert limiter.limit == pytest.approx(before * 0.9)
+
+
+def test_call_with_limits_refunds_and_pauses_everyone_on_429(clock, monkeypatch):
+    monkeypatch.setattr(settings, "openai_max_retries", 2)
+    limiter = RateLimiter("test", rpm=0, tpm=600, max_concurrency=8)  # 10 tokens/s, capacity 100; limit starts at 4
+    calls: list[float] = []
+
+    def fn(slot):
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise _error(RateLimitError, 429, {"retry-after": "3"})
+        return "ok"
+
+    assert call_with_limits(limiter, 50, fn) == "ok"
+    # 2 回目は共有の pause が明けてから呼ばれる
+    assert calls == [0.0, 3.0]
+    assert clock.sleeps == [3.0]
+    # 429 の予約は返却され、成功した呼び出しの分だけが残る
+    assert limiter.tokens.available() == pytest.approx(50.0)
+    assert limiter.rate_limited_total == 1
+    # 4 -> 2（429）-> 2.5（成功）
+    assert limiter.concurrency.limit == pytest.approx(2.5)
+
+
+def test_call_with_limits_backs_off_locally_on_transient_errors(clock, monkeypatch):
+    monkeypatch.setattr(settings, "openai_max_retries", 2)
+    limiter = RateLimiter("test", rpm=0, tpm=0, max_concurrency=4)
+    calls = 0
+
+    def fn(slot):
+        nonlocal calls
+        calls += 1
+        raise _error(InternalServerError, 500)
+
+    with pytest.raises(InternalServerError):
+        call_with_limits(limiter, 10, fn)
+    assert calls == 3
+    assert clock.sleeps == [1.0, 2.0]
+    assert limiter.stats()["paused_seconds"] == 0.0
+    assert limiter.rate_limited_total == 0
+
+
+def test_call_with_limits_does_not_retry_other_errors(clock, monkeypatch):
+    monkeypatch.setattr(settings, "openai_max_retries", 2)
+    limiter = RateLimiter("test", rpm=0, tpm=0, max_concurrency=4)
+    calls = 0
+
+    def fn(slot):
+        nonlocal calls
+        calls += 1
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        call_with_limits(limiter, 10, fn)
+    assert calls == 1
+    assert clock.sleeps == []
+
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+
+from app.utils import iter_streamed_json_objects
+
+DOC = {
+    "symptoms": [
+        {"symptom": "発熱", "spans": [{"start": 0, "end": 2, "text": "発熱"}], "negated_spans": []},
+        {"symptom": 'quote " and brace } ] {', "spans": [], "negated_spans": []},
+        {"symptom": "back\\slash\\", "spans": [{"start": 3, "end": 4, "text": "}"}], "negated_spans": []},
+    ]
+}
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_yields_each_array_element_for_every_chunk_size() -> None:
+    text = json.dumps(DOC, ensure_ascii=False)
+    # チャンク境界が文字列内・エスケープの直後など任意の位置に来ても結果が変わらないこと
+    for size in range(1, len(text) + 1):
+        assert list(iter_streamed_json_objects(_chunks(text, size), depth=2)) == DOC["symptoms"], size
+
+
+def test_escaped_quote_split_across_chunks() -> None:
+    text = json.dumps({"symptoms": [{"symptom": 'a\\"}'}]})
+    split = text.index("\\") + 1
+    chunks = [text[:split], text[split:]]
+    assert list(iter_streamed_json_objects(chunks, depth=2)) == [{"symptom": 'a\\"}'}]
+
+
+def test_yields_object_before_stream_finishes() -> None:
+    text = json.dumps(DOC, ensure_ascii=False)
+    # 1件目の症状オブジェクトの閉じ括弧まで
+    first_end = text.index("[]}") + 3
+    consumed: list[str] = []
+
+    def gen():
+        for chunk in (text[:first_end], text[first_end:]):
+            consumed.append(chunk)
+            yield chunk
+
+    it = iter_streamed_json_objects(gen(), depth=2)
+    assert next(it) == DOC["symptoms"][0]
+    assert len(consumed) == 1
+
+
+def test_skips_malformed_objects() -> None:
+    chunks = ['{"symptoms": [{"symptom": "a"}, {bad}, {"symptom": "b"}]}']
+    assert list(iter_streamed_json_objects(chunks, depth=2)) == [{"symptom": "a"}, {"symptom": "b"}]
+
+
+def test_incomplete_trailing_object_is_not_yielded() -> None:
+    chunks = ['{"symptoms": [{"symptom": "a"}, {"symptom": "b"']
+    assert list(iter_streamed_json_objects(chunks, depth=2)) == [{"symptom": "a"}]
@@ -8,16 +8,20 @@ export async function proxyToBackend(req: Request, endpoint: string): Promise<Ne
 
     const r = await fetch(`${backendUrl}${endpoint}`, {
       method: "POST",
-      headers: { "content-type": "application/json" },
+      headers: { "content-type": "application/json", "x-priority": "interactive" },
       body: JSON.stringify(body),
       cache: "no-store"
     });
 
     const text = await r.text();
-    return new NextResponse(text, {
-      status: r.status,
-      headers: { "content-type": r.headers.get("content-type") ?? "application/json" }
-    });
+    const headers: Record<string, string> = {
+      "content-type": r.headers.get("content-type") ?? "application/json"
+    };
+    const retryAfter = r.headers.get("retry-after");
+    if (retryAfter) {
+      headers["retry-after"] = retryAfter;
+    }
+    return new NextResponse(text, { status: r.status, headers });
   } catch (error) {
     console.error(`[API Proxy Error] ${endpoint}:`, error);
     return new NextResponse(